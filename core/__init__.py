@@ -0,0 +1,4 @@
+from .image_data import clean_base64
+from .llm_cache import LLMCache
+
+__all__ = ["LLMCache", "clean_base64"]
@@ -0,0 +1,46 @@
+"""Normalization of client-supplied base64 images for Gemini ``inline_data``.
+
+Kept free of the web framework so it can run on a worker thread and be tested on
+its own.
+"""
+import base64
+import binascii
+import re
+
+# Canonical base64 as the REST API expects it: alphabet characters plus trailing padding
+_B64_CANONICAL_RE = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+_B64_NON_ALPHABET_RE = re.compile(r"[^A-Za-z0-9+/]")
+_URLSAFE_TO_STANDARD = str.maketrans("-_", "+/")
+
+
+def clean_base64(img_b64):
+    """Return (mime_type, base64) ready for inline_data.
+
+    Clients may send a ``data:`` URL, line-wrapped output (``base64.encodebytes``,
+    ``openssl base64``), the URL-safe alphabet with or without padding, or stray
+    characters. The prefix and whitespace are stripped and ``-_`` mapped to ``+/``;
+    anything still non-canonical is decoded leniently and re-encoded, so a
+    well-formed upload is passed through without a decode/encode round trip.
+
+    Raises ValueError if nothing decodable is left.
+    """
+    mime_type = "image/jpeg"
+    if img_b64.startswith("data:"):
+        header, _, img_b64 = img_b64.partition(",")
+        declared = header[5:].split(";", 1)[0]
+        if declared.startswith("image/"):
+            mime_type = declared
+    img_b64 = "".join(img_b64.split()).translate(_URLSAFE_TO_STANDARD)
+    if not _B64_CANONICAL_RE.fullmatch(img_b64):
+        # Drop stray characters (and misplaced padding) before decoding
+        img_b64 = _B64_NON_ALPHABET_RE.sub("", img_b64)
+    if len(img_b64) % 4 or not _B64_CANONICAL_RE.fullmatch(img_b64):
+        img_b64 = img_b64.rstrip("=")
+        img_b64 += "=" * (-len(img_b64) % 4)
+        try:
+            img_b64 = base64.b64encode(base64.b64decode(img_b64)).decode("ascii")
+        except binascii.Error:
+            img_b64 = ""
+    if not img_b64:
+        raise ValueError("Image is not valid base64")
+    return mime_type, img_b64
@@ -0,0 +1,229 @@
+"""Response cache for Gemini answers.
+
+Two tiers:
+- exact: SHA-256 of the normalized prompt, kept in an in-memory LRU and
+  optionally mirrored to Redis (set REDIS_URL) so workers can share answers
+- semantic: embeddings of previously answered questions; a new question whose
+  cosine similarity to a cached one reaches the threshold reuses that answer
+
+The embedding function is injected (an ``async`` callable returning a vector) so
+the cache can share the app's HTTP client instead of opening its own.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """Exact + semantic cache mapping user questions to generated answers"""
+
+    def __init__(self, prefix="", maxsize=128, ttl=3600, threshold=0.92,
+                 embed=None, enabled=True, redis_url=None):
+        self.prefix = prefix
+        # The prefix is encoded and hashed once; key() only feeds in the question
+        self._prefix_hash = hashlib.sha256(prefix.encode("utf-8"))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._embed = embed
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (text, expires_at)
+        self._keys = []                # semantic row index -> key
+        self._matrix = None            # (N, D) float32, rows L2-normalized
+
+        self._redis = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("⚠️ REDIS_URL set but the redis package is not installed")
+            else:
+                self._redis = aioredis.Redis.from_url(redis_url)
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question):
+        # Case and whitespace differences ("Kakapo", " kakapo ", "kakapo  diet") share a slot
+        return " ".join(question.lower().split())
+
+    def key(self, question):
+        h = self._prefix_hash.copy()
+        h.update(self.normalize(question).encode("utf-8"))
+        return h.hexdigest()
+
+    async def embed(self, question):
+        """Embed a question for the semantic tier, or return None if unavailable"""
+        if self._embed is None:
+            return None
+        try:
+            values = await self._embed(self.normalize(question))
+        except Exception as e:
+            logger.warning("⚠️ Embedding failed, using exact cache only: %s", e)
+            return None
+        emb = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(emb)
+        return emb / norm if norm else None
+
+    async def get(self, question, record_stats=True):
+        """Return (answer, embedding); answer is None on a miss.
+
+        The embedding is handed back so a following set() doesn't embed twice. Internal
+        lookups (e.g. warm-up) pass ``record_stats=False`` so they don't skew /cache/stats.
+        """
+        if not self.enabled:
+            return None, None
+
+        key = self.key(question)
+        text = await self._get_exact(key)
+        if text is not None:
+            if record_stats:
+                with self._lock:
+                    self.hits_exact += 1
+            return text, None
+
+        emb = await self.embed(question)
+        if emb is not None:
+            text = await self._get_semantic(emb)
+            if text is not None:
+                if record_stats:
+                    with self._lock:
+                        self.hits_semantic += 1
+                return text, emb
+
+        if record_stats:
+            with self._lock:
+                self.misses += 1
+        return None, emb
+
+    async def set(self, question, text, ttl=None, embedding=None):
+        if not self.enabled or not text:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        key = self.key(question)
+
+        with self._lock:
+            self._entries[key] = (text, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            # Add the row before evicting, so an entry evicted straight away (e.g.
+            # maxsize=0) takes its row with it instead of leaving an orphan behind
+            if embedding is not None and key not in self._keys:
+                self._keys.append(key)
+                row = embedding[np.newaxis, :]
+                self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._drop_row(evicted)
+
+        if self._redis is not None:
+            try:
+                await self._redis.setex(key, ttl, text)
+            except Exception as e:
+                logger.warning("⚠️ Redis cache write failed: %s", e)
+
+    @property
+    def shared(self):
+        """True when entries are mirrored to Redis, so every worker sees them"""
+        return self._redis is not None
+
+    async def claim(self, question, ttl=120):
+        """Claim ``question`` for one worker only (Redis SET NX); True for the winner.
+
+        Used so one-off work such as startup warm-up runs once per deployment instead of
+        once per worker. The claim only has to outlive the work itself, so it expires
+        after ``ttl`` seconds; call release() if the work fails so another worker (or the
+        next deploy) can retry. Without Redis there is nothing to coordinate on, so it
+        always returns True.
+        """
+        if self._redis is None:
+            return True
+        try:
+            return bool(await self._redis.set(self._claim_key(question), 1, nx=True, ex=ttl))
+        except Exception as e:
+            logger.warning("⚠️ Redis claim failed: %s", e)
+            return False
+
+    async def release(self, question):
+        """Drop a claim taken with claim(), e.g. after the claimed work failed"""
+        if self._redis is None:
+            return
+        try:
+            await self._redis.delete(self._claim_key(question))
+        except Exception as e:
+            logger.warning("⚠️ Redis claim release failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "semantic_entries": len(self._keys),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": (self.hits_exact + self.hits_semantic) / lookups if lookups else 0.0,
+                "redis": self._redis is not None,
+            }
+
+    # -------------------------
+    # Internals
+    # -------------------------
+
+    async def _get_exact(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                text, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return text
+                del self._entries[key]
+                self._drop_row(key)
+
+        if self._redis is not None:
+            try:
+                value = await self._redis.get(key)
+            except Exception as e:
+                logger.warning("⚠️ Redis cache read failed: %s", e)
+                return None
+            if value is not None:
+                return value.decode("utf-8")
+        return None
+
+    async def _get_semantic(self, emb):
+        with self._lock:
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ emb
+            idx = int(np.argmax(scores))
+            if scores[idx] < self.threshold:
+                return None
+            key = self._keys[idx]
+        return await self._get_exact(key)
+
+    def _claim_key(self, question):
+        return "claim:" + self.key(question)
+
+    def _drop_row(self, key):
+        # Caller holds the lock
+        try:
+            idx = self._keys.index(key)
+        except ValueError:
+            return
+        del self._keys[idx]
+        self._matrix = np.delete(self._matrix, idx, axis=0) if self._keys else None
@@ -0,0 +1,10 @@
+import multiprocessing
+import os
+
+# Each uvicorn worker runs an asyncio loop, so one process multiplexes many requests
+# that are waiting on Gemini; worker count only needs to cover the CPU-bound parts, and
+# every extra worker adds its own response cache and startup pre-warm
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+keepalive = 75
@@ -1,16 +1,67 @@
-from flask import Flask, request, jsonify
+from quart import Quart, Response, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+import asyncio
+import concurrent.futures
 import cv2
 import numpy as np
 import base64
-import google.generativeai as genai
+import httpx
+import logging
+import orjson
 import os
+import re
 
-app = Flask(__name__)
+from core import LLMCache, clean_base64
 
-# 🔑 Configure Gemini API key from environment variable
+# Request-path diagnostics go through logging so they cost nothing below LOG_LEVEL.
+# LOG_LEVEL applies to this app's loggers only; the root (and so httpx/httpcore, which
+# log every request at INFO) stays at WARNING.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+for _noisy in ("httpx", "httpcore"):
+    logging.getLogger(_noisy).setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+logger.setLevel(LOG_LEVEL)
+logging.getLogger("core").setLevel(LOG_LEVEL)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson; jsonify() responses are encoded straight to bytes"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default), mimetype=self.mimetype
+        )
+
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+# Largest accepted request body; a base64 photo for /analyze-image fits comfortably
+app.config["MAX_CONTENT_LENGTH"] = 8 * 1024 * 1024
+
+# 🔑 Gemini API key from environment variable
 API_KEY = os.getenv("GEMINI_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+EMBEDDING_MODEL = "models/text-embedding-004"
+
+# Models to try in order of preference for free tier
+MODELS_TO_TRY = (
+    "gemini-2.0-flash",
+    "gemini-1.5-flash",
+    "gemini-1.5-flash-latest",
+)
 
 # System prompt (restricted to kakapo)
 KAKAPO_SYSTEM_PROMPT = """You are an expert chatbot specializing exclusively in kakapo (Strigops habroptilus), 
@@ -21,7 +72,22 @@ Rules:
 - If not about kakapo → say: "I'm sorry, I only have knowledge about kakapo, the endangered flightless parrot of New Zealand."
 """
 
-# Safety settings for Gemini
+# Sent as Gemini's system instruction rather than prepended to every question, so no
+# per-request prompt string is built and the backend can reuse the shared prefix
+SYSTEM_INSTRUCTION = {"parts": [{"text": KAKAPO_SYSTEM_PROMPT}]}
+
+# User-facing Dialogflow messages for known failure modes, checked in order
+_ERR_TABLE = (
+    (re.compile(r"404|not found", re.I),
+     "I'm having trouble connecting to my AI service. Please try again in a moment."),
+    (re.compile(r"quota|\b429\b", re.I),
+     "I've reached my usage limit. Please try again later."),
+    (re.compile(r"api key", re.I),
+     "There's a configuration issue. Please contact the administrator."),
+)
+_ERR_DEFAULT = "I encountered an error while processing your request. Please try again."
+
+# Safety settings for Gemini, in the REST request shape (built once, reused by every call)
 SAFETY_SETTINGS = [
     {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
     {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
@@ -29,144 +95,524 @@ SAFETY_SETTINGS = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
 ]
 
-# Model configuration with fallback options
-def get_model(prefer_vision=False):
-    """Get the best available Gemini model with fallback options"""
-    
-    # Try models in order of preference for free tier
-    if prefer_vision:
-        models_to_try = [
-            "gemini-2.0-flash",
-            "gemini-1.5-flash",
-            "gemini-1.5-flash-latest",
-        ]
-    else:
-        models_to_try = [
-            "gemini-2.0-flash",
-            "gemini-1.5-flash",
-            "gemini-1.5-flash-latest",
-        ]
-    
-    for model_name in models_to_try:
+# -------------------------
+# GEMINI CLIENT
+# -------------------------
+
+# Shared across all requests; created when the server starts, closed when it stops
+gemini_client = None
+
+# Common questions (one per line) answered in the background at startup, so their first
+# real request is a cache hit. Needs the shared Redis tier: each question is claimed by
+# exactly one worker, and the others read the answer back from Redis on demand. Nothing
+# happens if the file doesn't exist.
+WARMUP_FILE = os.getenv("LLM_WARMUP_FILE", os.path.join(os.path.dirname(__file__), "warmup.txt"))
+# How long a worker's claim on a warm-up question lasts; only needs to cover one
+# generateContent call with its retries, and is released early if that call fails
+WARMUP_CLAIM_TTL = 120
+_warmup_task = None
+
+# Last model that answered successfully, tried first on the next call
+_preferred_model = MODELS_TO_TRY[0]
+
+# Transient upstream statuses worth retrying; 429 is left alone since quota doesn't
+# come back within a backoff window
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.2
+# ...unless the server says it will, via a Retry-After short enough to wait out once
+MAX_RETRY_AFTER = 2.0
+
+# Upper bound on the startup pre-warm, well inside gunicorn's 30s worker boot timeout
+PREWARM_TIMEOUT = 3.0
+
+# The embedding only feeds the semantic cache lookup, so a slow one is abandoned (and
+# not retried) rather than added to the latency of a cache miss
+EMBED_TIMEOUT = 2.0
+
+
+class GeminiError(Exception):
+    """Error response returned by the Gemini REST API"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+def new_gemini_client():
+    """Build an HTTP/2 keep-alive client authenticated for the Gemini REST API"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=MAX_RETRIES,  # connection failures only
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+    return httpx.AsyncClient(
+        base_url=GEMINI_API_BASE,
+        headers={"x-goog-api-key": API_KEY or ""},
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        transport=transport,
+    )
+
+
+@app.before_serving
+async def startup():
+    global gemini_client, _warmup_task
+    gemini_client = new_gemini_client()
+
+    # Open the pooled TLS + HTTP/2 connection now (in every worker) so the first user
+    # request doesn't pay for the handshake. A model lookup is enough and uses no quota.
+    # The overall wait is capped: the client's connect timeout plus transport retries
+    # could otherwise hold up worker startup for ~40s on an unreachable network.
+    if API_KEY:
         try:
-            model = genai.GenerativeModel(
-                model_name,
-                safety_settings=SAFETY_SETTINGS
+            await asyncio.wait_for(
+                gemini_client.get(f"/models/{_preferred_model}", timeout=PREWARM_TIMEOUT),
+                PREWARM_TIMEOUT,
             )
-            print(f"✅ Using model: {model_name}")
-            return model
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Could not pre-warm Gemini connection: timed out")
         except Exception as e:
-            print(f"⚠️ Model {model_name} not available: {str(e)}")
+            logger.warning("⚠️ Could not pre-warm Gemini connection: %s", e)
+
+    if API_KEY and RESPONSE_CACHE.enabled and os.path.exists(WARMUP_FILE):
+        if RESPONSE_CACHE.shared:
+            _warmup_task = asyncio.create_task(warm_response_cache(WARMUP_FILE))
+        else:
+            logger.info("Skipping cache warm-up: it needs REDIS_URL so workers don't each repeat it")
+
+
+@app.after_serving
+async def shutdown():
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        # Let the task release its in-flight claim before the clients go away
+        await asyncio.gather(_warmup_task, return_exceptions=True)
+    await gemini_client.aclose()
+    CV_EXECUTOR.shutdown(wait=False)
+
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header, or None if absent or unparseable"""
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def _send(client, method, url, stream=False, **kwargs):
+    """Send a request, retrying transient 5xx responses with exponential backoff and
+    waiting out a short Retry-After on 429 once.
+
+    With ``stream=True`` the body is left unread so the caller can iterate it (and must
+    close the response); only the status line is checked, so retries happen before any
+    bytes reach the client.
+    """
+    waited_for_rate_limit = False
+    for attempt in range(MAX_RETRIES + 1):
+        response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        if response.status_code == 429 and not waited_for_rate_limit and attempt < MAX_RETRIES:
+            delay = _retry_after(response)
+            if delay is not None and delay <= MAX_RETRY_AFTER:
+                waited_for_rate_limit = True
+                await response.aclose()
+                await asyncio.sleep(delay)
+                continue
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return response
+        await response.aclose()
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+def _raise_for_gemini_error(response):
+    if response.status_code < 400:
+        return
+    # Only Gemini's own JSON errors carry a useful message; HTML error pages from the
+    # edge aren't worth decoding, the status line says enough
+    message = response.reason_phrase
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            message = orjson.loads(response.content)["error"]["message"]
+        except Exception:
+            pass
+    raise GeminiError(response.status_code, message)
+
+
+def _candidate_text(data):
+    """Extract the answer text the way the SDK's ``response.text`` does"""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        reason = data.get("promptFeedback", {}).get("blockReason", "no candidates returned")
+        raise Exception(f"Gemini returned no answer: {reason}")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+def _generate_payload(parts):
+    return {
+        "systemInstruction": SYSTEM_INSTRUCTION,
+        "contents": [{"role": "user", "parts": parts}],
+        "safetySettings": SAFETY_SETTINGS,
+    }
+
+
+def _models_in_order():
+    return (_preferred_model,) + tuple(m for m in MODELS_TO_TRY if m != _preferred_model)
+
+
+async def generate_content(parts):
+    """Call generateContent with the given parts, falling back through MODELS_TO_TRY"""
+    global _preferred_model
+
+    payload = _generate_payload(parts)
+    for model_name in _models_in_order():
+        response = await _send(
+            gemini_client, "POST", f"/models/{model_name}:generateContent", json=payload
+        )
+        if response.status_code == 404:
+            logger.warning("⚠️ Model %s not available", model_name)
             continue
-    
+        _raise_for_gemini_error(response)
+        _preferred_model = model_name
+        return _candidate_text(orjson.loads(response.content))
+
     raise Exception("No available Gemini models found. Please check your API key and quota.")
 
+
+async def stream_generate_content(parts):
+    """Like generate_content(), but yields the answer text chunk by chunk as it's generated"""
+    global _preferred_model
+
+    payload = _generate_payload(parts)
+    for model_name in _models_in_order():
+        response = await _send(
+            gemini_client, "POST", f"/models/{model_name}:streamGenerateContent",
+            stream=True, params={"alt": "sse"}, json=payload,
+        )
+        try:
+            if response.status_code == 404:
+                logger.warning("⚠️ Model %s not available", model_name)
+                continue
+            if response.status_code >= 400:
+                await response.aread()
+                _raise_for_gemini_error(response)
+            _preferred_model = model_name
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    yield _candidate_text(orjson.loads(line[6:]))
+            return
+        finally:
+            await response.aclose()
+
+    raise Exception("No available Gemini models found. Please check your API key and quota.")
+
+
+async def embed_content(text):
+    # wait_for also bounds the transport's connect retries, which the timeout alone doesn't
+    response = await asyncio.wait_for(
+        gemini_client.post(
+            f"/{EMBEDDING_MODEL}:embedContent",
+            json={"model": EMBEDDING_MODEL, "content": {"parts": [{"text": text}]}},
+            timeout=EMBED_TIMEOUT,
+        ),
+        EMBED_TIMEOUT,
+    )
+    _raise_for_gemini_error(response)
+    return orjson.loads(response.content)["embedding"]["values"]
+
+
+async def fetch_models(client):
+    """List models that support generateContent, following pagination"""
+    models = []
+    params = {"pageSize": 1000}
+    while True:
+        response = await _send(client, "GET", "/models", params=params)
+        _raise_for_gemini_error(response)
+        data = orjson.loads(response.content)
+        for m in data.get("models", []):
+            if "generateContent" in m.get("supportedGenerationMethods", []):
+                models.append({
+                    "name": m["name"],
+                    "display_name": m.get("displayName"),
+                })
+        if not data.get("nextPageToken"):
+            return models
+        params["pageToken"] = data["nextPageToken"]
+
+
+# Cache of generated answers for /ask and /webhook. Reusing answers is only sound while
+# generation stays effectively deterministic for this narrow domain — set
+# LLM_CACHE_ENABLED=0 if a sampling temperature is ever configured.
+RESPONSE_CACHE = LLMCache(
+    prefix=KAKAPO_SYSTEM_PROMPT + "\n\nUser question: ",
+    # Dialogflow traffic repeats a small set of intents, so a larger cache keeps far more
+    # of them warm; 1024 semantic rows of text-embedding-004 are ~3 MB per worker
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("LLM_CACHE_TTL", "3600")),
+    threshold=0.92,
+    embed=embed_content if os.getenv("LLM_CACHE_SEMANTIC", "1") == "1" else None,
+    enabled=os.getenv("LLM_CACHE_ENABLED", "1") == "1",
+    redis_url=os.getenv("REDIS_URL"),
+)
+
+
+async def warm_response_cache(path):
+    """Answer each question listed in ``path`` that isn't cached yet, one at a time.
+
+    Every worker runs this, but a question is only sent to Gemini by the worker that
+    claims it first.
+    """
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        queries = [line for line in lines if line and not line.startswith("#")]
+
+    for query in queries:
+        if not await RESPONSE_CACHE.claim(query, ttl=WARMUP_CLAIM_TTL):
+            continue
+        try:
+            answer, embedding = await RESPONSE_CACHE.get(query, record_stats=False)
+            if answer is None:
+                answer = await generate_content([{"text": query}])
+                await RESPONSE_CACHE.set(query, answer, embedding=embedding)
+        except asyncio.CancelledError:
+            # Shutting down mid-question: free it for the next worker or deploy
+            await RESPONSE_CACHE.release(query)
+            raise
+        except Exception as e:
+            await RESPONSE_CACHE.release(query)
+            logger.warning("⚠️ Cache warm-up failed for %r: %s", query, e)
+
+    logger.info("✅ Response cache warm-up finished for %d questions", len(queries))
+
+# -------------------------
+# IMAGE ANALYSIS
+# -------------------------
+
+# OpenCV releases the GIL, so edge detection runs in threads while the event loop
+# waits on Gemini
+CV_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+# Long edge the image is scaled down to before Canny, which is O(pixels)
+CV_MAX_DIMENSION = 512
+
+
+def _run_opencv(img_b64):
+    """Decode the base64 image and count Canny edges; returns None if it can't be decoded"""
+    # Only this branch needs raw bytes, so the base64 decode happens here, off the loop
+    img_bytes = base64.b64decode(img_b64, validate=False)
+
+    # frombuffer is a zero-copy view over img_bytes; the reduced mode lets the JPEG
+    # decoder scale both dimensions by 1/2 and emit a single grayscale channel
+    # (all Canny needs) while decoding
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    del img_bytes
+    if img is None:
+        return None
+
+    # Large photos are further shrunk to CV_MAX_DIMENSION on the long edge; image_shape
+    # reports the size the edge count was actually computed on
+    h, w = img.shape[:2]
+    scale = CV_MAX_DIMENSION / max(h, w)
+    if scale < 1:
+        img = cv2.resize(
+            img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA
+        )
+
+    edges = cv2.Canny(img, 100, 200)
+    return {
+        "edges_detected": int(cv2.countNonZero(edges)),
+        "image_shape": list(img.shape[:2])
+    }
+
+async def _gather_or_cancel(*aws):
+    """Like asyncio.gather, but cancels the remaining awaitables as soon as one fails.
+
+    Plain gather leaves siblings running, so a failed OpenCV step would still let the
+    Gemini request go out. The original exception is re-raised unchanged (TaskGroup
+    would wrap it in an ExceptionGroup, muddying the error returned to the client).
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+# -------------------------
+# STREAMING
+# -------------------------
+
+def _sse_event(data, event=None):
+    prefix = b"event: " + event.encode() + b"\n" if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+async def _stream_answer(question, answer, embedding):
+    """Server-Sent Events for /ask: one ``data`` event per chunk, then ``done`` or ``error``"""
+    if answer is not None:
+        yield _sse_event({"text": answer})
+        yield _sse_event({}, event="done")
+        return
+
+    chunks = []
+    try:
+        async for text in stream_generate_content([{"text": question}]):
+            chunks.append(text)
+            yield _sse_event({"text": text})
+    except Exception as e:
+        logger.error("❌ Error in /ask stream: %s", e)
+        yield _sse_event({"error": str(e)}, event="error")
+        return
+
+    await RESPONSE_CACHE.set(question, "".join(chunks), embedding=embedding)
+    yield _sse_event({}, event="done")
+
+# -------------------------
+# REQUEST PARSING
+# -------------------------
+
+def _too_large_response():
+    # Dialogflow retries non-2xx fulfillment responses, so the webhook always answers 200
+    if request.endpoint == "webhook":
+        return jsonify({
+            "fulfillmentText": "Your request was too large for me to process.",
+            "source": "kakapo-chatbot"
+        })
+    return jsonify({"error": "Request body too large"}), 413
+
+
+@app.before_request
+async def reject_oversized_body():
+    """Refuse bodies over MAX_CONTENT_LENGTH before any of them is read"""
+    if request.content_length and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+        return _too_large_response()
+
+
+@app.errorhandler(RequestEntityTooLarge)
+async def body_too_large(e):
+    """Chunked bodies have no Content-Length, so they're only caught while being read"""
+    return _too_large_response()
+
+
+async def read_json():
+    """Parse the request body with orjson, without keeping the raw bytes on the request"""
+    return orjson.loads(await request.get_data(cache=False))
+
 # -------------------------
 # ROUTES
 # -------------------------
 
 @app.route("/", methods=["GET"])
-def home():
+async def home():
     return jsonify({
         "status": "running",
         "service": "Kakapo Expert Chatbot API",
-        "endpoints": ["/ask", "/analyze-image", "/webhook", "/list-models", "/requirements"]
+        "endpoints": ["/ask", "/analyze-image", "/webhook", "/list-models", "/requirements", "/cache/stats"]
     })
 
 @app.route("/requirements", methods=["GET"])
-def requirements():
+async def requirements():
     """Return all Python dependency requirements for this backend"""
     deps = {
-        "flask": ">=3.0.0",
+        "quart": ">=0.19.0",
+        "flask": ">=3.0.3,<3.1",
+        "httpx[http2]": ">=0.27.0",
+        "orjson": ">=3.9.0",
+        "uvicorn": ">=0.29.0",
+        "redis": ">=5.0.0",
         "opencv-python": ">=4.9.0",
-        "numpy": ">=1.24.0",
-        "google-generativeai": ">=0.7.0",
-        "python-dotenv": ">=1.0.0"
+        "numpy": ">=1.24.0"
     }
     return jsonify({"requirements": deps, "count": len(deps)})
 
 @app.route("/list-models", methods=["GET"])
-def list_models():
+async def list_models():
     try:
         if not API_KEY:
             return jsonify({"error": "GEMINI_API_KEY not set"}), 500
         
-        models = []
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                models.append({
-                    "name": m.name,
-                    "display_name": m.display_name,
-                })
+        models = await fetch_models(gemini_client)
         return jsonify({"available_models": models, "count": len(models)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/ask", methods=["POST"])
-def ask_gemini():
+async def ask_gemini():
     try:
         if not API_KEY:
             return jsonify({"error": "GEMINI_API_KEY not configured"}), 500
         
-        data = request.get_json()
+        data = await read_json()
         question = data.get("question", "").strip()
         
         if not question:
             return jsonify({"error": "No question provided"}), 400
         
-        model = get_model(prefer_vision=False)
-        full_prompt = KAKAPO_SYSTEM_PROMPT + "\n\nUser question: " + question
-        response = model.generate_content(full_prompt)
+        answer, embedding = await RESPONSE_CACHE.get(question)
+
+        # Opt-in streaming so clients can render the answer as it's generated
+        wants_stream = data.get("stream") or "text/event-stream" in request.headers.get("Accept", "")
+        if wants_stream:
+            return Response(
+                _stream_answer(question, answer, embedding),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+            )
+
+        if answer is None:
+            answer = await generate_content([{"text": question}])
+            await RESPONSE_CACHE.set(question, answer, embedding=embedding)
         
-        return jsonify({"answer": response.text})
+        return jsonify({"answer": answer})
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error in /ask: {str(e)}")
+        logger.error("❌ Error in /ask: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/analyze-image", methods=["POST"])
-def analyze_image():
+async def analyze_image():
     try:
         if not API_KEY:
             return jsonify({"error": "GEMINI_API_KEY not configured"}), 500
         
-        data = request.get_json()
+        data = await read_json()
         img_b64 = data.get("image", "")
         question = data.get("question", "Is this a kakapo?")
         
         if not img_b64:
             return jsonify({"error": "No image provided"}), 400
         
-        img_bytes = base64.b64decode(img_b64)
-
-        model = get_model(prefer_vision=True)
-        image_part = {"mime_type": "image/jpeg", "data": img_bytes}
-        prompt = KAKAPO_SYSTEM_PROMPT + "\n\n" + question
-        response = model.generate_content([prompt, image_part])
+        # The client already sends base64, which is what the REST API expects; it only
+        # needs normalizing when it isn't in canonical form. That scan is O(n) over a
+        # multi-megabyte string, so it runs off the event loop
+        loop = asyncio.get_running_loop()
+        try:
+            mime_type, img_b64 = await loop.run_in_executor(CV_EXECUTOR, clean_base64, img_b64)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        image_part = {"inline_data": {"mime_type": mime_type, "data": img_b64}}
 
-        img_array = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        opencv_analysis = None
-        
-        if img is not None:
-            edges = cv2.Canny(img, 100, 200)
-            edge_count = int(np.sum(edges > 0))
-            opencv_analysis = {
-                "edges_detected": edge_count,
-                "image_shape": list(img.shape[:2])
-            }
+        # The OpenCV work is independent of the answer, so hide it under the Gemini call
+        answer, opencv_analysis = await _gather_or_cancel(
+            generate_content([{"text": question}, image_part]),
+            loop.run_in_executor(CV_EXECUTOR, _run_opencv, img_b64),
+        )
         
         return jsonify({
-            "answer": response.text,
+            "answer": answer,
             "opencv_analysis": opencv_analysis
         })
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Error in /analyze-image: {str(e)}")
+        logger.error("❌ Error in /analyze-image: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/webhook", methods=["POST"])
-def webhook():
+async def webhook():
     try:
         if not API_KEY:
             return jsonify({
@@ -174,8 +620,8 @@ def webhook():
                 "source": "kakapo-chatbot"
             })
         
-        req = request.get_json(force=True)
-        print(f"📨 Received webhook request: {req}")
+        req = await read_json()
+        logger.debug("📨 Received webhook request: %r", req)
         
         query = req.get("queryResult", {}).get("queryText", "")
         
@@ -185,38 +631,41 @@ def webhook():
                 "source": "kakapo-chatbot"
             })
         
-        model = get_model(prefer_vision=False)
-        full_prompt = KAKAPO_SYSTEM_PROMPT + "\n\nUser question: " + query
-        response = model.generate_content(full_prompt)
+        answer, embedding = await RESPONSE_CACHE.get(query)
+        if answer is None:
+            answer = await generate_content([{"text": query}])
+            await RESPONSE_CACHE.set(query, answer, embedding=embedding)
         
         dialogflow_response = {
-            "fulfillmentText": response.text,
+            "fulfillmentText": answer,
             "source": "kakapo-chatbot"
         }
         
-        print(f"✅ Sending response: {response.text[:100]}...")
+        logger.debug("✅ Sending response: %.100s...", answer)
         return jsonify(dialogflow_response)
     
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ Error in /webhook: {error_msg}")
+        logger.error("❌ Error in /webhook: %s", error_msg)
         
-        if "404" in error_msg or "not found" in error_msg:
-            user_message = "I'm having trouble connecting to my AI service. Please try again in a moment."
-        elif "quota" in error_msg.lower():
-            user_message = "I've reached my usage limit. Please try again later."
-        elif "api key" in error_msg.lower():
-            user_message = "There's a configuration issue. Please contact the administrator."
-        else:
-            user_message = "I encountered an error while processing your request. Please try again."
+        user_message = next(
+            (message for pattern, message in _ERR_TABLE if pattern.search(error_msg)),
+            _ERR_DEFAULT,
+        )
         
         return jsonify({
             "fulfillmentText": user_message,
             "source": "kakapo-chatbot"
         })
 
+@app.route("/cache/stats", methods=["GET"])
+async def cache_stats():
+    return jsonify(RESPONSE_CACHE.stats())
+
 @app.route("/health", methods=["GET"])
-def health_check():
+async def health_check():
     api_key_set = bool(API_KEY)
     
     can_access_api = False
@@ -224,9 +673,16 @@ def health_check():
     
     if api_key_set:
         try:
-            model = get_model(prefer_vision=False)
+            # Same bound as the pre-warm, so a stalled upstream can't hang the probe
+            response = await asyncio.wait_for(
+                gemini_client.get(f"/models/{_preferred_model}", timeout=PREWARM_TIMEOUT),
+                PREWARM_TIMEOUT,
+            )
+            _raise_for_gemini_error(response)
             can_access_api = True
             model_info = "API accessible"
+        except asyncio.TimeoutError:
+            model_info = f"API error: no response within {PREWARM_TIMEOUT:g}s"
         except Exception as e:
             model_info = f"API error: {str(e)[:100]}"
     
@@ -240,6 +696,10 @@ def health_check():
 # -------------------------
 # MAIN ENTRY
 # -------------------------
+async def _list_model_names():
+    async with new_gemini_client() as client:
+        return [m["name"].replace('models/', '') for m in await fetch_models(client)]
+
 if __name__ == "__main__":
     print("\n" + "="*50)
     print("🦜 KAKAPO CHATBOT API")
@@ -254,11 +714,7 @@ if __name__ == "__main__":
         
         try:
             print("\n📋 Checking available models...")
-            models = []
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods:
-                    model_name = m.name.replace('models/', '')
-                    models.append(model_name)
+            models = asyncio.run(_list_model_names())
             
             if models:
                 print(f"✅ Found {len(models)} available models:")
@@ -274,4 +730,4 @@ if __name__ == "__main__":
     print("\n🚀 Starting server on http://0.0.0.0:5000")
     print("="*50 + "\n")
     
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,46 @@
+import base64
+
+import pytest
+
+from core.image_data import clean_base64
+
+RAW = bytes(range(256)) * 3
+CANONICAL = base64.b64encode(RAW).decode("ascii")
+
+
+def decoded(result):
+    _, img_b64 = result
+    return base64.b64decode(img_b64, validate=True)
+
+
+def test_canonical_input_passes_through_unchanged():
+    assert clean_base64(CANONICAL) == ("image/jpeg", CANONICAL)
+
+
+def test_data_url_prefix_is_stripped_and_mime_type_kept():
+    mime_type, img_b64 = clean_base64("data:image/png;base64," + CANONICAL)
+    assert (mime_type, img_b64) == ("image/png", CANONICAL)
+
+
+def test_non_image_data_url_falls_back_to_jpeg():
+    assert clean_base64("data:text/plain;base64," + CANONICAL)[0] == "image/jpeg"
+
+
+def test_line_wrapped_input_is_joined():
+    assert clean_base64(base64.encodebytes(RAW).decode("ascii")) == ("image/jpeg", CANONICAL)
+
+
+def test_urlsafe_alphabet_without_padding_is_converted():
+    urlsafe = base64.urlsafe_b64encode(RAW[:-1]).decode("ascii").rstrip("=")
+    assert "-" in urlsafe and "_" in urlsafe
+    assert decoded(clean_base64(urlsafe)) == RAW[:-1]
+
+
+def test_stray_characters_are_dropped():
+    assert decoded(clean_base64(CANONICAL[:40] + "!*" + CANONICAL[40:])) == RAW
+
+
+@pytest.mark.parametrize("img_b64", ["", "!!!", "A", "data:image/png;base64,"])
+def test_undecodable_input_raises(img_b64):
+    with pytest.raises(ValueError):
+        clean_base64(img_b64)
@@ -0,0 +1,150 @@
+import asyncio
+
+import numpy as np
+
+from core import llm_cache
+from core.llm_cache import LLMCache
+
+# Fixed unit vectors so semantic matches are predictable without an embedding API
+VECTORS = {
+    "kakapo diet": [1.0, 0.0, 0.0],
+    "what do kakapo eat": [0.99, 0.1, 0.0],
+    "kakapo habitat": [0.0, 1.0, 0.0],
+    "kakapo lifespan": [0.0, 0.0, 1.0],
+}
+
+
+async def fake_embed(text):
+    return VECTORS[text]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def fill(cache, *questions):
+    for q in questions:
+        _, emb = await cache.get(q)
+        await cache.set(q, f"answer: {q}", embedding=emb)
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    cache = LLMCache(prefix="p")
+
+    async def scenario():
+        await cache.set("Kakapo  diet", "seeds")
+        return await cache.get("  kakapo diet ")
+
+    assert run(scenario()) == ("seeds", None)
+    assert cache.stats()["hits_exact"] == 1
+
+
+def test_semantic_hit_above_threshold():
+    cache = LLMCache(embed=fake_embed)
+
+    async def scenario():
+        await fill(cache, "kakapo diet")
+        answer, _ = await cache.get("what do kakapo eat")
+        return answer
+
+    assert run(scenario()) == "answer: kakapo diet"
+    assert cache.stats()["hits_semantic"] == 1
+
+
+def test_lru_eviction_drops_oldest_entry_and_its_row():
+    cache = LLMCache(maxsize=2, embed=fake_embed)
+
+    async def scenario():
+        await fill(cache, "kakapo diet", "kakapo habitat", "kakapo lifespan")
+        return await cache.get("kakapo diet")
+
+    answer, _ = run(scenario())
+    assert answer is None
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["semantic_entries"] == 2
+    assert cache._matrix.shape == (2, 3)
+
+
+def test_maxsize_zero_leaves_no_orphan_rows():
+    cache = LLMCache(maxsize=0, embed=fake_embed)
+    run(fill(cache, "kakapo diet"))
+
+    stats = cache.stats()
+    assert stats["size"] == 0
+    assert stats["semantic_entries"] == 0
+    assert cache._matrix is None
+
+
+def test_expired_entry_is_removed_with_its_row(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now[0])
+    cache = LLMCache(ttl=10, embed=fake_embed)
+    run(fill(cache, "kakapo diet"))
+
+    now[0] += 11
+    answer, _ = run(cache.get("kakapo diet"))
+
+    assert answer is None
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["semantic_entries"] == 0
+
+
+def test_rows_stay_normalized():
+    cache = LLMCache(embed=fake_embed)
+    run(fill(cache, "what do kakapo eat"))
+
+    assert np.allclose(np.linalg.norm(cache._matrix, axis=1), 1.0)
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for claim/release: SET NX EX and DEL"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        self.ttls[key] = ex
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+        self.ttls.pop(key, None)
+
+
+def test_claim_is_exclusive_short_lived_and_releasable():
+    cache = LLMCache()
+    cache._redis = FakeRedis()
+
+    async def scenario():
+        first = await cache.claim("kakapo diet", ttl=120)
+        second = await cache.claim("Kakapo diet")
+        await cache.release("kakapo diet")
+        after_release = await cache.claim("kakapo diet")
+        return first, second, after_release
+
+    assert run(scenario()) == (True, False, True)
+    assert list(cache._redis.ttls.values()) == [120]
+
+
+def test_claim_without_redis_always_wins():
+    cache = LLMCache()
+    assert run(cache.claim("kakapo diet")) is True
+    assert run(cache.claim("kakapo diet")) is True
+
+
+def test_unrecorded_lookups_leave_stats_alone():
+    cache = LLMCache()
+
+    async def scenario():
+        await cache.get("kakapo diet", record_stats=False)
+        await cache.set("kakapo diet", "seeds")
+        await cache.get("kakapo diet", record_stats=False)
+
+    run(scenario())
+    stats = cache.stats()
+    assert (stats["hits_exact"], stats["hits_semantic"], stats["misses"]) == (0, 0, 0)